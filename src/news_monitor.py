@@ -4,29 +4,53 @@
 from __future__ import annotations
 
 import argparse
+import codecs
 import hashlib
-import json
+import heapq
 import os
 import smtplib
 import sys
-from dataclasses import dataclass
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from email.message import EmailMessage
 from pathlib import Path
-from typing import Any
+from typing import Any, NamedTuple
 from urllib.parse import urljoin
 
+import ahocorasick
+import lxml.etree
+import orjson
 import requests
 import yaml
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 REQUEST_TIMEOUT_SECONDS = 20
 MAX_LINKS_PER_COMPANY = 50
+MAX_FETCH_WORKERS = 16
+STREAM_CHUNK_BYTES = 16384
+BYTE_ORDER_MARKS = (codecs.BOM_UTF8, codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)
 USER_AGENT = (
     "Mozilla/5.0 (compatible; portfolio-news-monitor/1.0; "
     "+https://github.com/your-username/portfolio-news-monitor)"
 )
 
+# One pooled session for every fetch so repeated hosts reuse their TCP/TLS connections.
+_SESSION = requests.Session()
+_SESSION.headers.update({"User-Agent": USER_AGENT})
+_ADAPTER = HTTPAdapter(
+    pool_connections=MAX_FETCH_WORKERS,
+    pool_maxsize=MAX_FETCH_WORKERS,
+    max_retries=Retry(total=2, backoff_factor=0.3),
+)
+_SESSION.mount("https://", _ADAPTER)
+_SESSION.mount("http://", _ADAPTER)
+
+# Authenticated Gmail connection, opened on first send and reused while the server keeps it open.
+_SMTP: smtplib.SMTP_SSL | None = None
+
 
 @dataclass
 class Company:
@@ -34,6 +58,30 @@ class Company:
     ticker: str
     ir_url: str
     include_keywords: list[str]
+    # Aho-Corasick automaton over include_keywords; None means every link is kept.
+    keyword_matcher: ahocorasick.Automaton | None = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # An empty keyword matches every link (as "" in text does), so no filter is needed;
+        # the automaton would also silently drop it.
+        if self.include_keywords and all(self.include_keywords):
+            matcher = ahocorasick.Automaton()
+            for keyword in self.include_keywords:
+                matcher.add_word(keyword, keyword)
+            matcher.make_automaton()
+            self.keyword_matcher = matcher
+
+
+class Link(NamedTuple):
+    title: str
+    url: str
+
+
+@dataclass
+class FetchResult:
+    links: list[Link] | None  # None when the page answered 304 Not Modified
+    etag: str | None = None
+    last_modified: str | None = None
 
 
 def parse_args() -> argparse.Namespace:
@@ -47,7 +95,15 @@ def parse_args() -> argparse.Namespace:
     )
     parser.add_argument("--dry-run", action="store_true", help="Print alert instead of sending email")
     parser.add_argument("--verbose", action="store_true", help="Print additional debug logs")
-    return parser.parse_args()
+    parser.add_argument(
+        "--interval-seconds",
+        type=int,
+        help="Keep running and re-check every N seconds, reusing HTTP and SMTP connections where possible",
+    )
+    args = parser.parse_args()
+    if args.interval_seconds is not None and args.interval_seconds <= 0:
+        parser.error("--interval-seconds must be positive")
+    return args
 
 
 def load_companies(config_path: Path) -> list[Company]:
@@ -77,69 +133,164 @@ def load_companies(config_path: Path) -> list[Company]:
 def load_state(path: Path) -> dict[str, Any]:
     if not path.exists():
         return {}
-    with path.open("r", encoding="utf-8") as handle:
-        return json.load(handle)
+    return orjson.loads(path.read_bytes())
 
 
 def save_state(path: Path, state: dict[str, Any]) -> None:
-    with path.open("w", encoding="utf-8") as handle:
-        json.dump(state, handle, indent=2, sort_keys=True)
+    # Write compact JSON to a sibling temp file and swap it in, so a crash never leaves a torn state file.
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_bytes(orjson.dumps(state, option=orjson.OPT_SORT_KEYS))
+    os.replace(tmp_path, path)
+
 
+def declared_charset(content_type: str) -> str | None:
+    # Only a charset the server actually sent: requests' response.encoding falls back to
+    # ISO-8859-1 for text/* and would override a <meta charset> in the page.
+    for param in content_type.split(";")[1:]:
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "charset":
+            return value.strip().strip("\"'") or None
+    return None
 
-def fetch_links(company: Company, verbose: bool = False) -> list[dict[str, str]]:
-    response = requests.get(
+
+def html_parser(encoding: str | None) -> lxml.etree.HTMLParser:
+    try:
+        return lxml.etree.HTMLParser(encoding=encoding)
+    except LookupError:  # charset libxml2 does not know; detect from the document instead
+        return lxml.etree.HTMLParser()
+
+
+def fetch_links(
+    company: Company,
+    etag: str | None = None,
+    last_modified: str | None = None,
+    verbose: bool = False,
+) -> FetchResult:
+    with _SESSION.get(
         company.ir_url,
-        headers={"User-Agent": USER_AGENT},
+        headers={"If-None-Match": etag, "If-Modified-Since": last_modified},
         timeout=REQUEST_TIMEOUT_SECONDS,
-    )
-    response.raise_for_status()
-
-    soup = BeautifulSoup(response.text, "html.parser")
-    links: list[dict[str, str]] = []
+        stream=True,
+    ) as response:
+        response.raise_for_status()
+
+        if response.status_code == 304:
+            if verbose:
+                print(f"[{company.ticker}] not modified since last check: {company.ir_url}")
+            # The stored links are still current, so their validators carry over unless refreshed.
+            return FetchResult(
+                None,
+                response.headers.get("ETag", etag),
+                response.headers.get("Last-Modified", last_modified),
+            )
 
-    for anchor in soup.find_all("a", href=True):
-        text = " ".join(anchor.get_text(" ", strip=True).split())
-        href = anchor["href"].strip()
+        # Fresh links must only be stored with validators that describe this response.
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+
+        # Feed the parser as the body arrives so parsing overlaps the download. A charset given
+        # only in Content-Type must be passed explicitly, or libxml2 falls back to Latin-1.
+        charset = declared_charset(response.headers.get("Content-Type", ""))
+        parser = None
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_BYTES):
+            if parser is None:
+                # A byte order mark outranks the header charset (as in browsers), and an explicit
+                # encoding would make libxml2 ignore it, so decide once the first bytes are in.
+                parser = html_parser(None if chunk.startswith(BYTE_ORDER_MARKS) else charset)
+            parser.feed(chunk)
+
+        document = None
+        if parser is not None:  # no chunks means an empty body
+            try:
+                document = parser.close()
+            except lxml.etree.XMLSyntaxError:
+                document = None
+
+    if document is not None:
+        # BeautifulSoup's get_text() never returned script/style/template contents; drop them so
+        # code and CSS stay out of titles and keyword matches.
+        lxml.etree.strip_elements(document, "script", "style", "template", with_tail=False)
+        anchors = document.iter("a")
+    else:
+        anchors = ()
+    matcher = company.keyword_matcher
+    seen: set[Link] = set()
+    links: list[Link] = []
+
+    for anchor in anchors:
+        href = (anchor.get("href") or "").strip()
         if not href:
             continue
+        text = " ".join(" ".join(anchor.itertext()).split())
 
         absolute = urljoin(company.ir_url, href)
-        lower_text = text.lower()
-        lower_url = absolute.lower()
 
-        if company.include_keywords:
-            if not any(k in lower_text or k in lower_url for k in company.include_keywords):
+        if matcher is not None:
+            # NUL never appears in a keyword, so no match can straddle text and URL.
+            blob = f"{text}\x00{absolute}".lower()
+            if next(matcher.iter(blob), None) is None:
                 continue
 
-        links.append({"title": text or absolute, "url": absolute})
-
-    deduped = {(item["title"], item["url"]): item for item in links}
-    normalized = list(deduped.values())
-    normalized.sort(key=lambda x: (x["title"].lower(), x["url"].lower()))
+        # Titles like "Download PDF" and URLs repeat across anchors and in the prior state; share one object
+        # for each and let set lookups short-circuit on identity.
+        absolute = sys.intern(absolute)
+        link = Link(sys.intern(text) if text else absolute, absolute)
+        if link in seen:
+            continue
+        seen.add(link)
+        links.append(link)
 
     if verbose:
-        print(f"[{company.ticker}] collected {len(normalized)} candidate links from {company.ir_url}")
-
-    return normalized[:MAX_LINKS_PER_COMPANY]
-
-
-def digest_links(links: list[dict[str, str]]) -> str:
-    payload = json.dumps(links, sort_keys=True, separators=(",", ":"))
-    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
-
-
-def build_change_report(previous: list[dict[str, str]], current: list[dict[str, str]]) -> tuple[list[dict[str, str]], list[dict[str, str]]]:
-    previous_set = {(item["title"], item["url"]) for item in previous}
-    current_set = {(item["title"], item["url"]) for item in current}
-
-    added = [
-        {"title": title, "url": url}
-        for title, url in sorted(current_set - previous_set, key=lambda x: (x[0].lower(), x[1].lower()))
-    ]
-    removed = [
-        {"title": title, "url": url}
-        for title, url in sorted(previous_set - current_set, key=lambda x: (x[0].lower(), x[1].lower()))
-    ]
+        print(f"[{company.ticker}] collected {len(links)} candidate links from {company.ir_url}")
+
+    # Same result as sort()[:MAX_LINKS_PER_COMPANY] (stable, key evaluated once per link),
+    # without ordering the links that get cut.
+    links = heapq.nsmallest(MAX_LINKS_PER_COMPANY, links, key=lambda x: (x.title.lower(), x.url.lower()))
+    return FetchResult(links, etag, last_modified)
+
+
+def cache_validators(company: Company, previous: dict[str, Any] | None) -> tuple[str | None, str | None]:
+    # Stored links are only reusable on a 304 if they were extracted with the same settings.
+    if (
+        not previous
+        or previous.get("ir_url") != company.ir_url
+        or previous.get("include_keywords") != company.include_keywords
+    ):
+        return None, None
+    return previous.get("etag"), previous.get("last_modified")
+
+
+def fetch_all(companies: list[Company], prior_companies: dict[str, Any], verbose: bool = False) -> list[FetchResult]:
+    # requests releases the GIL while waiting on sockets and lxml while parsing, so threads overlap both.
+    def fetch(company: Company) -> FetchResult:
+        etag, last_modified = cache_validators(company, prior_companies.get(company.ticker))
+        return fetch_links(company, etag, last_modified, verbose)
+
+    with ThreadPoolExecutor(max_workers=min(MAX_FETCH_WORKERS, len(companies))) as executor:
+        return list(executor.map(fetch, companies))
+
+
+def digest_links(links: list[Link]) -> str:
+    # fetch_links output is already ordered, so hash the pairs directly instead of a JSON dump.
+    # Unit/record separators keep the encoding unambiguous. This is only a change fingerprint,
+    # so a 128-bit BLAKE2b is plenty and faster than SHA-256.
+    digest = hashlib.blake2b(digest_size=16)
+    for link in links:
+        digest.update(link.title.encode("utf-8"))
+        digest.update(b"\x1f")
+        digest.update(link.url.encode("utf-8"))
+        digest.update(b"\x1e")
+    return digest.hexdigest()
+
+
+def build_change_report(previous: list[Link], current: list[Link]) -> tuple[list[Link], list[Link]]:
+    # Both lists come from fetch_links (directly or via saved state), so they are already deduped
+    # and in report order; filtering each against the other's set keeps that order without a sort.
+    previous_set = set(previous)
+    current_set = set(current)
+
+    added = [link for link in current if link not in previous_set]
+    removed = [link for link in previous if link not in current_set]
     return added, removed
 
 
@@ -154,12 +305,12 @@ def build_email(changes: list[dict[str, Any]]) -> EmailMessage:
         if change["added"]:
             lines.append("  New links:")
             for item in change["added"]:
-                lines.append(f"    + {item['title']} -> {item['url']}")
+                lines.append(f"    + {item.title} -> {item.url}")
 
         if change["removed"]:
             lines.append("  Removed links:")
             for item in change["removed"]:
-                lines.append(f"    - {item['title']} -> {item['url']}")
+                lines.append(f"    - {item.title} -> {item.url}")
 
         lines.append("")
 
@@ -180,47 +331,129 @@ def required_env(name: str) -> str:
     return value
 
 
-def send_email(msg: EmailMessage) -> None:
+def connect_smtp() -> smtplib.SMTP_SSL:
     username = required_env("GMAIL_USERNAME")
     app_password = required_env("GMAIL_APP_PASSWORD")
 
-    with smtplib.SMTP_SSL("smtp.gmail.com", 465) as smtp:
+    smtp = smtplib.SMTP_SSL("smtp.gmail.com", 465)
+    try:
         smtp.login(username, app_password)
-        smtp.send_message(msg)
+    except BaseException:
+        smtp.close()
+        raise
+    return smtp
+
+
+def smtp_alive(smtp: smtplib.SMTP_SSL) -> bool:
+    try:
+        return smtp.noop()[0] == 250
+    except (smtplib.SMTPException, OSError):
+        return False
+
+
+def send_email(msg: EmailMessage) -> None:
+    # The logged-in connection is kept in _SMTP so --interval-seconds runs can skip the TLS and
+    # AUTH round trips while Gmail keeps it open. A NOOP checks it first; Gmail times out idle
+    # sessions with a 421, in which case reconnect and send once more.
+    global _SMTP
+    if _SMTP is not None and not smtp_alive(_SMTP):
+        close_smtp()
+    if _SMTP is None:
+        _SMTP = connect_smtp()
+    try:
+        _SMTP.send_message(msg)
+    except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException) as exc:
+        if isinstance(exc, smtplib.SMTPResponseException) and exc.smtp_code != 421:
+            raise
+        close_smtp()
+        _SMTP = connect_smtp()
+        _SMTP.send_message(msg)
+
+
+def close_smtp() -> None:
+    global _SMTP
+    if _SMTP is None:
+        return
+    try:
+        _SMTP.quit()
+    except (smtplib.SMTPException, OSError):
+        _SMTP.close()
+    _SMTP = None
 
 
 def main() -> int:
     args = parse_args()
+    try:
+        if args.interval_seconds is None:
+            return check_once(args)
+
+        try:
+            while True:
+                try:
+                    check_once(args)
+                except (requests.RequestException, smtplib.SMTPException, OSError) as exc:
+                    print(f"Check failed, state not updated; retrying next interval: {exc}", file=sys.stderr)
+                time.sleep(args.interval_seconds)
+        except KeyboardInterrupt:  # Ctrl-C is how a daemon run is stopped
+            return 0
+    finally:
+        close_smtp()
+
+
+def check_once(args: argparse.Namespace) -> int:
     config_path = Path(args.config)
     state_path = Path(args.state)
 
     companies = load_companies(config_path)
     prior_state = load_state(state_path)
 
-    next_state: dict[str, Any] = {"companies": {}, "updated_at": datetime.now(timezone.utc).isoformat()}
-    changes: list[dict[str, Any]] = []
+    prior_companies: dict[str, Any] = prior_state.get("companies") or {}
+    fetched = fetch_all(companies, prior_companies, verbose=args.verbose)
 
-    for company in companies:
-        links = fetch_links(company, verbose=args.verbose)
-        digest = digest_links(links)
+    now_iso = datetime.now(timezone.utc).isoformat()
+    next_state: dict[str, Any] = {"companies": {}, "updated_at": now_iso}
+    changes: list[dict[str, Any]] = []
 
-        previous = prior_state.get("companies", {}).get(company.ticker)
+    for company, result in zip(companies, fetched):
+        previous = prior_companies.get(company.ticker)
         previous_digest = previous.get("digest") if previous else None
-        previous_links = previous.get("links", []) if previous else []
+        # A 304 leaves result.links unset; the stored links (and digest) still stand.
+        digest = digest_links(result.links) if result.links is not None else previous_digest
 
-        next_state["companies"][company.ticker] = {
+        entry: dict[str, Any] = {
             "name": company.name,
             "ir_url": company.ir_url,
+            "include_keywords": company.include_keywords,
             "digest": digest,
-            "links": links,
-            "checked_at": datetime.now(timezone.utc).isoformat(),
+            "etag": result.etag,
+            "last_modified": result.last_modified,
+            "checked_at": now_iso,
         }
+        next_state["companies"][company.ticker] = entry
+
+        if previous is not None and digest == previous_digest:
+            # Unchanged: carry the stored link payload forward instead of rebuilding it.
+            entry["links"] = previous.get("links", [])
+            continue
+
+        links = result.links or []
+        entry["links"] = [link._asdict() for link in links]
 
         is_first_run = previous is None
-        changed = previous_digest is not None and previous_digest != digest
+        changed = previous_digest is not None
 
         if changed or (is_first_run and args.notify_on_first_run):
-            added, removed = build_change_report(previous_links, links)
+            if is_first_run:
+                # Nothing to diff against: fetch_links output is already deduped and sorted.
+                added, removed = links, []
+            else:
+                previous_links = [
+                    Link(sys.intern(item["title"]), sys.intern(item["url"])) for item in previous.get("links", [])
+                ]
+                added, removed = build_change_report(previous_links, links)
+            if changed and not added and not removed:
+                # Same links under a different digest scheme (e.g. state from an older version).
+                continue
             changes.append(
                 {
                     "name": company.name,
@@ -231,20 +464,20 @@ def main() -> int:
                 }
             )
 
-    save_state(state_path, next_state)
-
     if not changes:
         print("No changes detected.")
-        return 0
-
-    msg = build_email(changes)
-    if args.dry_run:
-        print("Dry run mode: would send this email:\n")
-        print(msg)
-        return 0
-
-    send_email(msg)
-    print(f"Sent email for {len(changes)} company update(s).")
+    else:
+        msg = build_email(changes)
+        if args.dry_run:
+            print("Dry run mode: would send this email:\n")
+            print(msg)
+        else:
+            send_email(msg)
+            print(f"Sent email for {len(changes)} company update(s).")
+
+    # Only persist once the alert is out: if sending fails, the next check still diffs against
+    # the old state and reports the same changes again.
+    save_state(state_path, next_state)
     return 0
 
 